@@ -5,5 +5,33 @@ TELEGRAM_TOKEN = os.environ.get('TELEGRAM_TOKEN')
 AWS_ACCESS_KEY_ID = os.environ.get('MY_AWS_ACCESS_KEY_ID')
 AWS_SECRET_ACCESS_KEY = os.environ.get('MY_AWS_SECRET_ACCESS_KEY')
 AWS_DEFAULT_REGION = os.environ.get('MY_AWS_DEFAULT_REGION')
+AWS_ENDPOINT_URL = os.environ.get('MY_AWS_ENDPOINT_URL')
 
 EXCHANGE_ENDPOINT_URL = 'https://iss.moex.com/iss/engines/stock/markets/shares/boards/TQBR/securities.json'
+
+HTTP_CONNECT_TIMEOUT = 3.05
+HTTP_READ_TIMEOUT = 10
+HTTP_POOL_SIZE = 10
+HTTP_MAX_RETRIES = 3
+
+AWS_CONNECT_TIMEOUT = 2
+AWS_READ_TIMEOUT = 5
+AWS_MAX_POOL_CONNECTIONS = 10
+AWS_MAX_ATTEMPTS = 3
+
+# a CSV import is stored with one UpdateItem, whose expression may not exceed 4 KB
+DOCUMENT_TICKERS_LIMIT = 100
+
+DEDUP_CACHE_SIZE = 1024
+# an update is claimed for DEDUP_LEASE seconds, which should cover the Lambda timeout, so a retry of an
+# invocation that timed out is handled again. Once handled it is remembered for DEDUP_TTL seconds
+DEDUP_LEASE = 60
+DEDUP_TTL = 24 * 60 * 60
+
+# digests are scheduled in Moscow time, MOEX main session closes at 18:50. end_of_day and weekly digests
+# are sent by the first refresh tick after DIGEST_END_OF_DAY_HOUR, so the EventBridge schedule of the
+# refresh should include a tick between the close and the next open, e.g. cron(5 16 ? * MON-FRI *) in UTC
+DIGEST_UTC_OFFSET = 3
+DIGEST_END_OF_DAY_HOUR = 19
+DIGEST_WEEKLY_DAY = 4
+DIGEST_DEFAULT_THRESHOLD = 1000
@@ -10,6 +10,7 @@ my_tickers_description = 'Получить список добавленных 
 cancel_description = 'Отменить текущее действие'
 my_investment_portfolio_description = 'Стоимость твоего портфеля'
 detail_description = 'Подробнее о конкретной акции'
+digest_description = 'Настроить рассылку об изменении портфеля'
 
 detail_command = 'Введи название тикера. Все доступные тикеры можно посмотреть командой /ticker_list'
 detail_no_ticker_error = 'Такого тикера нет. Посмотреть список тикеров можно командой /ticker_list\n' \
@@ -53,19 +54,39 @@ help_command = \
     '/update - изменить количество лотов для акции\n\n' \
     'Ты можешь добавить сразу несколько акций, отправив мне файл с разрешением .csv\n' \
     'В первом столбце файла перечисли тикеры, а во втором - количество лотов у тебя.\n\n'\
-    'Каждый день во время закрытия торгов я буду отправлять тебе сообщение о том, ' \
-    'как изменилась стоимость твоего портфеля\n\n'\
+    'Я буду присылать тебе сообщения о том, как изменилась стоимость твоего портфеля. ' \
+    'Как часто - можно настроить командой /digest\n\n'\
     'Впрочем, ты можешь посмотреть его стоимость в любое время:\n'\
     '/my_investment_portfolio - стоимость твоего портфеля\n'\
     '/my_tickers - список и количество добавленных тобой акций\n'\
     '/detail - посмотреть детализацию конкретного тикера'
 
 
+digest_schedules = {
+    'intraday': 'при каждом обновлении цен',
+    'end_of_day': 'после закрытия торгов',
+    'weekly': 'раз в неделю, после закрытия торгов в пятницу',
+    'threshold': 'только если портфель изменился больше, чем на {threshold}₽',
+}
+digest_command = 'Сейчас я присылаю изменение стоимости портфеля {schedule}.\n\n' \
+                 'Изменить настройку можно командой /digest <режим>:\n' \
+                 'intraday - при каждом обновлении цен\n' \
+                 'end_of_day - после закрытия торгов\n' \
+                 'weekly - раз в неделю\n' \
+                 'threshold <сумма> - только при изменении больше суммы в рублях'
+digest_updated = 'Готово. Теперь я буду присылать изменение стоимости портфеля {schedule}'
+digest_error = 'Такого режима нет. Доступные режимы: intraday, end_of_day, weekly, threshold <сумма>'
+
+
 document_read_error = 'Ошибка при чтении файла. Используйте кодировку UTF-8 и расширение .csv'
 document_file_processed = 'Файл обработан\n\n'
 document_tickers_added = 'Добавлены тикеры:\n'
 document_ticker_error = '\nСледующие тикеры не добавлены из-за ошибки в названии:\n'
 document_amount_error = '\nСледующие тикеры не добавлены из-за ошибки в количестве лотов:\n'
+document_tickers_limit_error = 'В файле слишком много тикеров. За один раз можно добавить не больше {limit}, ' \
+                               'раздели файл на несколько'
+
 
+save_error = 'Не удалось сохранить изменения. Попробуй ещё раз чуть позже'
 
 not_text_error = 'Сейчас принимается только текст. Отменить операцию можно командой /cancel'
@@ -0,0 +1,63 @@
+import bot_config
+
+
+# Clients live at module level so that TLS connections are reused across warm Lambda invocations.
+# Their libraries are imported on first use to keep them out of the cold start of paths that do not need them.
+_http_session = None
+_dynamodb = None
+
+
+def get_http_session():
+    global _http_session
+
+    if _http_session is None:
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        # connection errors are retried for any method, status codes only for idempotent GETs
+        retry = Retry(total=bot_config.HTTP_MAX_RETRIES,
+                      backoff_factor=0.3,
+                      status_forcelist=(429, 500, 502, 503, 504),
+                      allowed_methods=frozenset(['GET']),
+                      respect_retry_after_header=True)
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=bot_config.HTTP_POOL_SIZE, max_retries=retry)
+
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        _http_session = session
+
+    return _http_session
+
+
+def get_http_timeout():
+    return bot_config.HTTP_CONNECT_TIMEOUT, bot_config.HTTP_READ_TIMEOUT
+
+
+def get_dynamodb(access_key_id, secret_access_key, region):
+    global _dynamodb
+
+    if _dynamodb is None:
+        import boto3
+        from botocore.config import Config
+
+        config = Config(max_pool_connections=bot_config.AWS_MAX_POOL_CONNECTIONS,
+                        connect_timeout=bot_config.AWS_CONNECT_TIMEOUT,
+                        read_timeout=bot_config.AWS_READ_TIMEOUT,
+                        retries={'mode': 'standard', 'max_attempts': bot_config.AWS_MAX_ATTEMPTS},
+                        tcp_keepalive=True)
+        _dynamodb = boto3.resource('dynamodb', aws_access_key_id=access_key_id,
+                                   aws_secret_access_key=secret_access_key,
+                                   region_name=region, endpoint_url=bot_config.AWS_ENDPOINT_URL,
+                                   config=config)
+
+    return _dynamodb
+
+
+def configure_telebot():
+    from telebot import apihelper
+
+    apihelper.session = get_http_session()
+    apihelper.CONNECT_TIMEOUT = bot_config.HTTP_CONNECT_TIMEOUT
+    apihelper.READ_TIMEOUT = bot_config.HTTP_READ_TIMEOUT
@@ -0,0 +1,44 @@
+from collections import OrderedDict
+import time
+import bot_config
+from models import BaseManager
+
+
+TABLE_NAME = 'updates'
+
+# update ids handled by this warm container, oldest first
+_seen = OrderedDict()
+
+
+def is_duplicate(update_id):
+    if update_id in _seen:
+        _seen.move_to_end(update_id)
+        return True
+
+    now = int(time.time())
+    try:
+        claimed = BaseManager.db.put_item_if_absent(TABLE_NAME, {
+            'update_id': update_id,
+            'expires_at': now + bot_config.DEDUP_LEASE
+        }, now)
+    except Exception as e:
+        # a failing dedup store must not drop updates
+        print(e)
+        return False
+
+    return not claimed
+
+
+def mark_processed(update_id):
+    _seen[update_id] = True
+    if len(_seen) > bot_config.DEDUP_CACHE_SIZE:
+        _seen.popitem(last=False)
+
+    try:
+        BaseManager.db.update_item(TABLE_NAME, update_id,
+                                   UpdateExpression='SET #ttl = :expires_at',
+                                   ExpressionAttributeNames={'#ttl': 'expires_at'},
+                                   ExpressionAttributeValues={':expires_at': int(time.time()) + bot_config.DEDUP_TTL})
+    except Exception as e:
+        # the lease still expires, at worst a later redelivery is handled again
+        print(e)
@@ -0,0 +1,102 @@
+from datetime import datetime, timedelta, timezone
+import bot_config
+import telegram_api
+from models import User
+from portfolio import value_shares
+
+
+# Only users whose schedule is due on this tick are read: every schedule is an indexed Query on
+# digest-index with digest_sent_on < the day the digest covers, and sending moves digest_sent_on to that day.
+# end_of_day and weekly cover the last closed session, so they go out on the first tick after the close
+# even if the schedule has no tick between the close and midnight.
+def get_last_session(local_now):
+    day = local_now.date()
+    if local_now.hour < bot_config.DIGEST_END_OF_DAY_HOUR:
+        day -= timedelta(days=1)
+    while day.weekday() >= 5:
+        day -= timedelta(days=1)
+
+    return day
+
+
+def get_due_schedules(now):
+    local_now = now.astimezone(timezone(timedelta(hours=bot_config.DIGEST_UTC_OFFSET)))
+    session = get_last_session(local_now)
+    week_session = session - timedelta(days=(session.weekday() - bot_config.DIGEST_WEEKLY_DAY) % 7)
+
+    return [
+        ('intraday', None),
+        ('threshold', local_now.date().isoformat()),
+        ('end_of_day', session.isoformat()),
+        ('weekly', week_session.isoformat()),
+    ]
+
+
+def get_recipients(due):
+    from botocore.exceptions import ClientError
+
+    try:
+        return {schedule: User.get_digest_recipients(schedule, sent_before) for schedule, sent_before in due}
+    except ClientError as e:
+        # digest-index is missing or still backfilling, e.g. right after a deploy
+        print(f'digest-index unavailable, scanning users: {e}')
+
+    recipients = {schedule: [] for schedule, _ in due}
+    due = dict(due)
+    for user in User.objects.all():
+        schedule = user.get('digest', User.fields['digest'])
+        sent_on = user.get('digest_sent_on', User.fields['digest_sent_on'])
+        if schedule in due and (not due[schedule] or sent_on < due[schedule]):
+            user.setdefault('digest_threshold', User.fields['digest_threshold'])
+            recipients[schedule].append(user)
+
+    return recipients
+
+
+def value_portfolios(users, snapshot):
+    portfolios = []
+    for user in users:
+        shares = value_shares(user['tickers'], snapshot, change=True)
+
+        portfolios.append((user,
+                           sum([share['users_capitalization'] for share in shares]),
+                           sum([share['change'] for share in shares]) if shares else None))
+
+    return portfolios
+
+
+def format_digest(schedule, total_price, total_change):
+    sign = '' if total_change < 0 else '+'
+
+    if schedule == 'intraday':
+        return f'Изменение стоимости активов: {sign}{total_change}'
+
+    # prices carry no history, so every digest reports the change of the last session
+    return f'Изменение за последнюю торговую сессию: {sign}{total_change}\n' \
+           f'Стоимость портфеля: {total_price}₽'
+
+
+def send_digests(snapshot, now=None):
+    due = get_due_schedules(now or datetime.now(timezone.utc))
+    recipients = get_recipients(due)
+
+    for schedule, sent_before in due:
+        for user, total_price, total_change in value_portfolios(recipients[schedule], snapshot):
+            if total_change is None:
+                # nothing to report, but the user is done for this period
+                if sent_before:
+                    User(user['user_id']).mark_digest_sent(sent_before)
+                continue
+
+            if schedule == 'threshold' and abs(total_change) < user['digest_threshold']:
+                continue
+
+            try:
+                telegram_api.send_message(user['user_id'], format_digest(schedule, total_price, total_change))
+            except Exception as e:
+                # e.g. 403 from a user who blocked the bot must not stop everybody else's digest
+                print(f'digest for {user["user_id"]}: {e}')
+                continue
+
+            if sent_before:
+                User(user['user_id']).mark_digest_sent(sent_before)
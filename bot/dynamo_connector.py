@@ -1,9 +1,9 @@
-import boto3
+import clients
 import exchange_connector
 
 
 class DynamoConnector:
-    ALLOWED_TABLE_NAMES = ['shares', 'users']
+    ALLOWED_TABLE_NAMES = ['shares', 'users', 'updates']
     KEY_SCHEMAS = {
         'shares': [{
             'AttributeName': 'ticker',
@@ -12,6 +12,10 @@ class DynamoConnector:
         'users': [{
             'AttributeName': 'user_id',
             'KeyType': 'HASH'
+        }],
+        'updates': [{
+            'AttributeName': 'update_id',
+            'KeyType': 'HASH'
         }]
     }
     ATTRIBUTE_DEFINITIONS = {
@@ -22,21 +26,58 @@ class DynamoConnector:
         'users': [{
             'AttributeName': 'user_id',
             'AttributeType': 'N'
+        }],
+        'updates': [{
+            'AttributeName': 'update_id',
+            'AttributeType': 'N'
         }]
     }
+    TIME_TO_LIVE_ATTRIBUTES = {
+        'updates': 'expires_at'
+    }
+    # filled in by models: {table_name: {index_name: {'hash_key': (name, type), 'sort_key': ..., 'projection': ...}}}
+    INDEXES = {}
+    FIELDS = {}
 
     def __init__(self, access_key_id, secret_access_key, region):
-        self.db = boto3.resource('dynamodb', aws_access_key_id=access_key_id, aws_secret_access_key=secret_access_key,
-                                 region_name=region)
+        self.access_key_id = access_key_id
+        self.secret_access_key = secret_access_key
+        self.region = region
+
+    @property
+    def db(self):
+        return clients.get_dynamodb(self.access_key_id, self.secret_access_key, self.region)
+
+    @classmethod
+    def register_model(cls, table_name, fields, indexes):
+        if fields:
+            cls.FIELDS[table_name] = fields
+        if indexes:
+            cls.INDEXES[table_name] = indexes
 
     def check_tables(self):
         existing_table_names = [table.name for table in self.db.tables.all()]
         for table_name in self.ALLOWED_TABLE_NAMES:
             if table_name not in existing_table_names:
                 self._create_table(table_name)
-                self.pool_data(table_name)
-            elif self.get_table(table_name).item_count == 0:
-                self.pool_data(table_name)
+            else:
+                self._create_missing_indexes(self.get_table(table_name))
+
+        if self.is_empty('shares'):
+            self.pool_data('shares')
+
+    # run before every deploy, see deploy.sh
+    def migrate(self):
+        self.check_tables()
+
+        # new fields, index keys among them, get their defaults on items written before they existed.
+        # Only items that lack a field are touched, so an interrupted run is simply repeated
+        for table_name in self.FIELDS:
+            self.fill_defaults(table_name)
+
+    # item_count is only refreshed every few hours, a one item scan is exact
+    def is_empty(self, table_name):
+        return not self.get_table(table_name).scan(Limit=1)['Items']
 
     def pool_data(self, table_name):
         if table_name == 'shares':
@@ -45,6 +86,26 @@ class DynamoConnector:
             with table.batch_writer() as batch:
                 for share in shares:
                     batch.put_item(Item=share)
+            return shares
+
+    def fill_defaults(self, table_name):
+        fields = self.FIELDS.get(table_name, {})
+        schema = self.KEY_SCHEMAS[table_name]
+
+        for item in self.get_table_items(table_name):
+            missing = [field for field in fields if field not in item]
+            if not missing:
+                continue
+
+            names = {f'#f{i}': field for i, field in enumerate(missing)}
+            values = {f':v{i}': self._get_default(fields[field]) for i, field in enumerate(missing)}
+            self.update_item(table_name,
+                             item[schema[0]['AttributeName']],
+                             item[schema[1]['AttributeName']] if len(schema) > 1 else None,
+                             UpdateExpression='SET ' + ', '.join(f'#f{i} = if_not_exists(#f{i}, :v{i})'
+                                                                 for i in range(len(missing))),
+                             ExpressionAttributeNames=names,
+                             ExpressionAttributeValues=values)
 
     def get_table(self, table_name):
         return self.db.Table(table_name)
@@ -72,10 +133,13 @@ class DynamoConnector:
         table = self.get_table(table_name)
         response = table.scan()
         items = response['Items']
+        while 'LastEvaluatedKey' in response:
+            response = table.scan(ExclusiveStartKey=response['LastEvaluatedKey'])
+            items += response['Items']
         if not isinstance(page, int):
             return items
 
-        item_count = response['Count']
+        item_count = len(items)
         if item_count % page_size != 0:
             page_count = item_count // page_size + 1
         else:
@@ -93,14 +157,81 @@ class DynamoConnector:
         table = self.get_table(table_name)
         table.put_item(Item=item)
 
+    # returns False if an unexpired item with the same key already exists
+    def put_item_if_absent(self, table_name, item, now):
+        table = self.get_table(table_name)
+        hash_key = self.KEY_SCHEMAS[table_name][0]['AttributeName']
+        ttl_attribute = self.TIME_TO_LIVE_ATTRIBUTES[table_name]
+
+        try:
+            # TTL deletion lags behind, so expired items are treated as absent
+            table.put_item(Item=item,
+                           ConditionExpression='attribute_not_exists(#key) OR #ttl < :now',
+                           ExpressionAttributeNames={'#key': hash_key, '#ttl': ttl_attribute},
+                           ExpressionAttributeValues={':now': now})
+        except table.meta.client.exceptions.ConditionalCheckFailedException:
+            return False
+
+        return True
+
+    # operations are ('update', table_name, hash_value, sort_value, update_kwargs) or ('put', table_name, item).
+    # A change to one user is a single item, so the writes do not depend on each other and need no transaction
+    def write_items(self, operations):
+        puts = {}
+        for operation, table_name, *args in operations:
+            if operation == 'update':
+                self.update_item(table_name, *args[:2], **args[2])
+            else:
+                puts.setdefault(table_name, []).append(args[0])
+
+        for table_name, items in puts.items():
+            if len(items) == 1:
+                self.add_item(table_name, items[0])
+                continue
+
+            with self.get_table(table_name).batch_writer() as batch:
+                for item in items:
+                    batch.put_item(Item=item)
+
+    def query_items(self, table_name, key_condition, index_name=None, projection=None, filter_expression=None,
+                    limit=None):
+        table = self.get_table(table_name)
+
+        kwargs = {'KeyConditionExpression': key_condition}
+        if index_name:
+            kwargs['IndexName'] = index_name
+        if filter_expression is not None:
+            kwargs['FilterExpression'] = filter_expression
+        if projection:
+            names = {f'#a{i}': name for i, name in enumerate(projection)}
+            kwargs['ProjectionExpression'] = ','.join(names)
+            kwargs['ExpressionAttributeNames'] = names
+
+        items = []
+        while True:
+            if limit:
+                kwargs['Limit'] = limit - len(items)
+            response = table.query(**kwargs)
+            items += response['Items']
+            if limit and len(items) >= limit:
+                return items[:limit]
+            if 'LastEvaluatedKey' not in response:
+                return items
+            kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
     def get_new_item(self, table_name, hash_value, sort_value, fields):
         key = self._get_table_key(table_name, hash_value, sort_value)
 
-        for field, field_type in fields.items():
-            key[field] = field_type()
+        for field, default in fields.items():
+            key[field] = self._get_default(default)
 
         return key
 
+    @staticmethod
+    def _get_default(default):
+        # fields map to either a type whose empty value is the default or to the default itself
+        return default() if callable(default) else default
+
     def _get_table_key(self, table_name, hash_value, sort_value):
         schema = self.KEY_SCHEMAS[table_name]
         hash_key = schema[0]['AttributeName']
@@ -119,20 +250,89 @@ class DynamoConnector:
         table.update_item(**kwargs)
 
     def _create_table(self, table_name):
+        kwargs = {}
+        indexes = self.INDEXES.get(table_name, {})
+        if indexes:
+            kwargs['GlobalSecondaryIndexes'] = [self._get_index_definition(index_name, index)
+                                                for index_name, index in indexes.items()]
+
         table = self.db.create_table(
             TableName=table_name,
             KeySchema=self.KEY_SCHEMAS[table_name],
-            AttributeDefinitions=self.ATTRIBUTE_DEFINITIONS[table_name],
+            AttributeDefinitions=self._get_attribute_definitions(table_name),
             ProvisionedThroughput={
                 'ReadCapacityUnits': 5,
                 'WriteCapacityUnits': 5
-            }
+            },
+            **kwargs
         )
 
-        table.meta.client.get_waiter('table_exists').wait(TableName=table)
+        table.meta.client.get_waiter('table_exists').wait(TableName=table_name)
+
+        if table_name in self.TIME_TO_LIVE_ATTRIBUTES:
+            table.meta.client.update_time_to_live(
+                TableName=table_name,
+                TimeToLiveSpecification={
+                    'Enabled': True,
+                    'AttributeName': self.TIME_TO_LIVE_ATTRIBUTES[table_name]
+                }
+            )
 
         return table
 
+    def _create_missing_indexes(self, table):
+        created = False
+        existing_index_names = [index['IndexName'] for index in table.global_secondary_indexes or []]
+        for index_name, index in self.INDEXES.get(table.name, {}).items():
+            if index_name in existing_index_names:
+                continue
+
+            # DynamoDB accepts one index creation per UpdateTable call
+            table.update(
+                AttributeDefinitions=self._get_attribute_definitions(table.name),
+                GlobalSecondaryIndexUpdates=[{'Create': self._get_index_definition(index_name, index)}]
+            )
+            table.meta.client.get_waiter('table_exists').wait(TableName=table.name)
+            created = True
+
+        return created
+
+    def _get_attribute_definitions(self, table_name):
+        definitions = list(self.ATTRIBUTE_DEFINITIONS[table_name])
+        defined = {definition['AttributeName'] for definition in definitions}
+
+        for index in self.INDEXES.get(table_name, {}).values():
+            for attribute in (index['hash_key'], index.get('sort_key')):
+                if attribute and attribute[0] not in defined:
+                    definitions.append({'AttributeName': attribute[0], 'AttributeType': attribute[1]})
+                    defined.add(attribute[0])
+
+        return definitions
+
+    @staticmethod
+    def _get_index_definition(index_name, index):
+        key_schema = [{'AttributeName': index['hash_key'][0], 'KeyType': 'HASH'}]
+        if index.get('sort_key'):
+            key_schema.append({'AttributeName': index['sort_key'][0], 'KeyType': 'RANGE'})
+
+        projection = index.get('projection')
+        if projection is None:
+            projection = {'ProjectionType': 'ALL'}
+        elif not projection:
+            projection = {'ProjectionType': 'KEYS_ONLY'}
+        else:
+            projection = {'ProjectionType': 'INCLUDE', 'NonKeyAttributes': list(projection)}
+
+        return {
+            'IndexName': index_name,
+            'KeySchema': key_schema,
+            'Projection': projection,
+            'ProvisionedThroughput': {
+                'ReadCapacityUnits': 5,
+                'WriteCapacityUnits': 5
+            }
+        }
+
 
 class WrongPageException(Exception):
     def __init__(self, page, last_page):
@@ -1,4 +1,4 @@
-import requests
+import clients
 import bot_config
 from decimal import Decimal
 import json
@@ -15,7 +15,9 @@ URL = f'{ENDPOINT}?{URL_PARAMS}'
 
 
 def get_shares():
-    response = requests.get(URL).json()
+    response = clients.get_http_session().get(URL, timeout=clients.get_http_timeout())
+    response.raise_for_status()
+    response = response.json()
 
     securities = response['securities']['data']
     marketdata = response['marketdata']['data']
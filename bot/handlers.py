@@ -0,0 +1,423 @@
+import telebot
+from telebot import types
+from dynamo_connector import WrongPageException
+import bot_config
+import clients
+import bot_messages
+from utils import isint
+from models import User, Exchange, unit_of_work
+from portfolio import get_user_shares
+
+
+clients.configure_telebot()
+bot = telebot.TeleBot(bot_config.TELEGRAM_TOKEN, threaded=False)
+
+
+def process_update(json_string):
+    update = telebot.types.Update.de_json(json_string)
+
+    bot.process_new_updates([update])
+
+
+@bot.message_handler(func=lambda message: True, commands=['start'])
+def start_handler(message):
+    bot.set_my_commands([
+        types.BotCommand('help', bot_messages.help_description),
+        types.BotCommand('add', bot_messages.add_description),
+        types.BotCommand('ticker_list', bot_messages.ticker_list_description),
+        types.BotCommand('detail', bot_messages.detail_description),
+        types.BotCommand('delete', bot_messages.delete_description),
+        types.BotCommand('update', bot_messages.update_description),
+        types.BotCommand('my_tickers', bot_messages.my_tickers_description),
+        types.BotCommand('my_investment_portfolio', bot_messages.my_investment_portfolio_description),
+        types.BotCommand('digest', bot_messages.digest_description),
+        types.BotCommand('cancel', bot_messages.cancel_description),
+    ])
+
+    user = User.objects.get_or_create(message.from_user.id)
+    if not save_changes(user.id):
+        return
+
+    bot.send_message(user.id, bot_messages.start_message)
+
+
+@bot.message_handler(func=lambda message: True, commands=['help'])
+def help_command(message):
+    bot.send_message(message.from_user.id, bot_messages.help_command)
+
+
+@bot.message_handler(func=lambda message: True, commands=['my_investment_portfolio'])
+def my_investment_portfolio_command(message):
+    shares = get_user_shares(message.from_user.id)
+
+    total_price = sum([share['users_capitalization'] for share in shares])
+
+    bot.send_message(message.from_user.id, f'Стоимость твоего портфеля на данный момент = {total_price}₽')
+
+
+@bot.message_handler(func=lambda message: True, commands=['my_tickers'])
+def my_tickers_command(message):
+    shares = get_user_shares(message.from_user.id)
+
+    response = '\n'.join([f'{share["ticker"]} - {share["amount"]} - {share["users_capitalization"]}₽'
+                          for share in shares])
+
+    bot.send_message(message.from_user.id, f'Список твоих тикеров:\n{response}\n'
+                                           f'Добавить новый можно командой /add\n'
+                                           f'Удалить можно командой /delete')
+
+
+@bot.message_handler(func=lambda message: True, commands=['digest'])
+def digest_command(message):
+    user = User.objects.get(message.from_user.id)
+    args = message.text.split()[1:]
+
+    if not args:
+        schedule, threshold = user.get_digest()
+        schedule = bot_messages.digest_schedules[schedule].format(threshold=threshold)
+        bot.send_message(message.from_user.id, bot_messages.digest_command.format(schedule=schedule))
+        return
+
+    schedule = args[0].lower()
+    threshold = None
+    if schedule == 'threshold' and len(args) > 1:
+        if not isint(args[1]) or int(args[1]) <= 0:
+            bot.send_message(message.from_user.id, bot_messages.digest_error)
+            return
+        threshold = int(args[1])
+    elif schedule not in User.DIGEST_SCHEDULES:
+        bot.send_message(message.from_user.id, bot_messages.digest_error)
+        return
+
+    user.set_digest(schedule, threshold)
+    if not save_changes(message.from_user.id):
+        return
+
+    if threshold is None:
+        threshold = user.get_digest()[1]
+    schedule = bot_messages.digest_schedules[schedule].format(threshold=threshold)
+    bot.send_message(message.from_user.id, bot_messages.digest_updated.format(schedule=schedule))
+
+
+@bot.message_handler(func=lambda message: True, commands=['ticker_list'])
+def ticker_list_command(message):
+    send_ticker_list(message.from_user.id, message.text)
+
+
+def save_changes(user_id):
+    # confirmations are only sent once the buffered writes are stored
+    try:
+        unit_of_work.flush()
+    except Exception as e:
+        print(e)
+        bot.send_message(user_id, bot_messages.save_error)
+        return False
+
+    return True
+
+
+def dialog_function_wrapper(error_message, allowed_commands=None):
+    if allowed_commands is None:
+        allowed_commands = []
+
+    def outer(func):
+        def wrapper(message, *args, **kwargs):
+            if message.content_type != 'text':
+                msg = bot.send_message(message.from_user.id, bot_messages.not_text_error)
+                if args:
+                    bot.register_next_step_handler(msg, wrapper, *args)
+                else:
+                    bot.register_next_step_handler(msg, wrapper)
+                return
+            elif message.text.startswith('/cancel'):
+                return
+            elif message.text in allowed_commands:
+                bot.process_new_messages([message])
+                return
+
+            result = func(message, *args, **kwargs)
+
+            if not result:
+                msg = bot.send_message(message.from_user.id, error_message)
+                if args:
+                    bot.register_next_step_handler(msg, wrapper, *args)
+                else:
+                    bot.register_next_step_handler(msg, wrapper)
+                return
+
+            return result
+
+        return wrapper
+
+    return outer
+
+
+# detail dialog
+@bot.message_handler(func=lambda message: True, commands=['detail'])
+def detail_command(message):
+    bot.send_message(message.from_user.id, bot_messages.detail_command)
+    bot.register_next_step_handler(message, detail_get_ticker)
+
+
+@dialog_function_wrapper(bot_messages.detail_get_ticker_error, ['/ticker_list'])
+def detail_get_ticker(message):
+    if message.text.isalpha():
+        tickers = Exchange.get_tickers()
+
+        if message.text.upper() in tickers:
+            share = Exchange.objects.get(message.text.upper())
+            share = share.get_data()
+
+            response = f'Вы запросили тикер {share["ticker"]}\n' \
+                       f'Это тикер компании {share["name"]}\n' \
+                       f'Цена за одну акцию: {share["price"]}\n' \
+                       f'Размер лота: {share["lot_size"]}\n' \
+                       f'Цена лота: {share["lot_price"]}'
+
+            user = User.objects.get(message.from_user.id)
+            user_shares = user.get_shares()
+
+            if share['ticker'] in user_shares.keys():
+                amount = user.get_shares()[share['ticker']]['amount']
+
+                share['amount'] = amount
+                response += f'\n\nКоличество ваших лотов: {share["amount"]}\n' \
+                            f'Общая цена ваших лотов: {share["amount"] * share["lot_price"]}'
+
+            bot.send_message(message.from_user.id, response)
+        else:
+            bot.send_message(message.from_user.id,
+                             bot_messages.detail_no_ticker_error)
+            bot.register_next_step_handler(message, detail_get_ticker)
+        return True
+# detail dialog end
+
+
+# addition dialog
+@bot.message_handler(func=lambda message: True, commands=['add'])
+def add_command(message):
+    bot.send_message(message.from_user.id, bot_messages.add_command)
+    bot.register_next_step_handler(message, add_get_ticker)
+
+
+@dialog_function_wrapper(bot_messages.add_get_ticker_error, ['/ticker_list'])
+def add_get_ticker(message):
+    if message.text.isalpha():
+        tickers = Exchange.get_tickers()
+
+        user = User.objects.get(message.from_user.id)
+        user_tickers = user.get_tickers()
+
+        if message.text.upper() in user_tickers:
+            bot.send_message(message.from_user.id,
+                             bot_messages.add_already_ticker_error)
+            bot.register_next_step_handler(message, add_get_ticker)
+        elif message.text.upper() in tickers:
+            bot.send_message(message.from_user.id, bot_messages.add_request_lot_amount)
+            bot.register_next_step_handler(message, add_get_lot_amount, message.text)
+        else:
+            bot.send_message(message.from_user.id,
+                             bot_messages.add_no_ticker_error)
+            bot.register_next_step_handler(message, add_get_ticker)
+        return True
+
+
+@dialog_function_wrapper(bot_messages.add_get_lot_amount_error)
+def add_get_lot_amount(message, ticker):
+    if message.text.isdigit() and isint(message.text) and int(message.text) > 0:
+        user = User.objects.get(message.from_user.id)
+
+        user.add_ticker(ticker, int(message.text))
+        if not save_changes(message.from_user.id):
+            return True
+
+        bot.send_message(message.from_user.id,
+                         f'Тикер {ticker} в количестве {message.text} добавлен\n'
+                         f' Удалить тикер из своего списка можно командой /delete\n'
+                         f'Изменить количество лотов можно командой /update')
+        return True
+# addition dialog end
+
+
+# delete dialog
+@bot.message_handler(func=lambda message: True, commands=['delete'])
+def delete_command(message):
+    bot.send_message(message.from_user.id, bot_messages.delete_command)
+    bot.register_next_step_handler(message, delete_get_ticker)
+
+
+@dialog_function_wrapper(bot_messages.delete_get_ticker_error, ['/my_tickers'])
+def delete_get_ticker(message):
+    if message.text.isalpha():
+        user = User.objects.get(message.from_user.id)
+
+        user_tickers = user.get_tickers()
+
+        if message.text.upper() in user_tickers:
+            user.delete_ticker(message.text)
+            if save_changes(message.from_user.id):
+                bot.send_message(message.from_user.id, f'Тикер {message.text} удалён')
+        else:
+            bot.send_message(message.from_user.id, bot_messages.delete_no_ticker_error)
+            bot.register_next_step_handler(message, delete_get_ticker)
+        return True
+# delete dialog end
+
+
+# update dialog
+@bot.message_handler(func=lambda message: True, commands=['update'])
+def update_command(message):
+    bot.send_message(message.from_user.id, bot_messages.update_command)
+    bot.register_next_step_handler(message, update_get_ticker)
+
+
+@dialog_function_wrapper(bot_messages.update_get_ticker_error, ['/my_tickers'])
+def update_get_ticker(message):
+    if message.text.isalpha():
+        user = User.objects.get(message.from_user.id)
+
+        user_tickers = user.get_tickers()
+
+        if message.text.upper() in user_tickers:
+            bot.send_message(message.from_user.id, bot_messages.update_request_lot_amount)
+            bot.register_next_step_handler(message, update_get_lot_amount, message.text)
+        else:
+            bot.send_message(message.from_user.id, bot_messages.update_no_ticker_error)
+            bot.register_next_step_handler(message, update_get_ticker)
+        return True
+
+
+@dialog_function_wrapper(bot_messages.update_get_lot_amount_error, ['/my_tickers'])
+def update_get_lot_amount(message, ticker):
+    if message.text.isdigit() and isint(message.text):
+        user = User.objects.get(message.from_user.id)
+
+        user.update_ticker(ticker, int(message.text))
+        if not save_changes(message.from_user.id):
+            return True
+
+        bot.send_message(message.from_user.id,
+                         f'Тикер {ticker} обновлён\n'
+                         f'Удалить тикер из своего списка можно командой /delete')
+        return True
+# update dialog end
+
+
+@bot.message_handler(func=lambda message: True, commands=['cancel'])
+def cancel_command(message):
+    bot.send_message(message.from_user.id, bot_messages.cancel_command)
+
+
+def send_ticker_list(user_id, message_text, page=1):
+    if len(message_text.split()) > 1 and message_text.split()[1].isdigit() and isint(message_text.split()[1]):
+        page = int(message_text.split()[1])
+
+    try:
+        tickers, prev_page, next_page, page_count = Exchange.objects.paginate(page)
+        tickers = [share['ticker'] for share in tickers]
+    except WrongPageException as e:
+        bot.send_message(user_id, str(e))
+        return
+
+    tickers = '\n'.join(tickers)
+
+    markup = None
+    if prev_page or next_page:
+        markup = types.InlineKeyboardMarkup()
+        if prev_page:
+            markup.add(types.InlineKeyboardButton('Предыдущая страница',
+                                                  callback_data=f'ticker_list_prev_page {prev_page}'))
+        if next_page:
+            markup.add(types.InlineKeyboardButton('Следующая страница',
+                                                  callback_data=f'ticker_list_next_page {next_page}'))
+
+    bot.send_message(user_id, f'Список тикеров:\n{tickers}\n'
+                              f'Страница {page}/{page_count}\n'
+                              f'Вы можете узнать больше информации про конкретный тикер командой /detail',
+                     reply_markup=markup)
+
+
+@bot.callback_query_handler(func=lambda call: True)
+def callback_worker(call):
+    if call.data.startswith('ticker_list_prev_page') or call.data.startswith('ticker_list_next_page'):
+        send_ticker_list(call.from_user.id, f'/ticker_list {call.data.split()[1]}')
+        bot.answer_callback_query(call.id)
+
+
+@bot.message_handler(content_types=['text'])
+def message_handler(message):
+    if message.text.startswith('/'):
+        bot.send_message(message.from_user.id, 'Нет такой команды')
+
+
+@bot.message_handler(content_types=['document'])
+def document_handler(message):
+    try:
+        if message.document.mime_type != 'text/csv':
+            raise Exception()
+
+        file_info = bot.get_file(message.document.file_id)
+        file = bot.download_file(file_info.file_path)
+
+        text = file.decode()
+    except Exception as e:
+        print(e)
+        bot.send_message(message.from_user.id, bot_messages.document_read_error)
+        bot.register_next_step_handler(message, document_handler)
+        return
+
+    tickers = Exchange.get_tickers()
+
+    errors_caused_by_ticker = []
+    errors_caused_by_amount = []
+    succeed_tickers = []
+
+    for row in text.split('\n'):
+        try:
+            ticker, amount = row.split(',')[:2]
+        except ValueError:
+            continue
+
+        ticker = ticker.upper()
+
+        if ticker not in tickers:
+            errors_caused_by_ticker.append(ticker)
+            continue
+
+        if not isint(amount):
+            errors_caused_by_amount.append((ticker, amount))
+            continue
+
+        succeed_tickers.append((ticker, amount))
+
+    if len({ticker for ticker, _ in succeed_tickers}) > bot_config.DOCUMENT_TICKERS_LIMIT:
+        bot.send_message(message.from_user.id,
+                         bot_messages.document_tickers_limit_error.format(limit=bot_config.DOCUMENT_TICKERS_LIMIT))
+        return
+
+    response_message = bot_messages.document_file_processed
+
+    if len(succeed_tickers):
+        user = User.objects.get(message.from_user.id)
+        response_message += bot_messages.document_tickers_added
+
+        for ticker, amount in succeed_tickers:
+            user.add_ticker(ticker, int(amount))
+            response_message += f'{ticker} в количестве {amount}\n'
+
+        if not save_changes(message.from_user.id):
+            return
+
+    if len(errors_caused_by_ticker):
+        response_message += bot_messages.document_ticker_error
+
+        for ticker in errors_caused_by_ticker:
+            response_message += f'{ticker}\n'
+
+    if len(errors_caused_by_amount):
+        response_message += bot_messages.document_amount_error
+
+        for ticker, amount in errors_caused_by_amount:
+            response_message += f'{ticker}: {amount}\n'
+
+    bot.send_message(message.from_user.id, response_message)
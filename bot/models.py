@@ -1,6 +1,9 @@
 from dynamo_connector import DynamoConnector
 import bot_config
-from boto3.dynamodb.conditions import Attr
+import copy
+
+
+REMOVE = object()
 
 
 class ObjectDoesNotExist(Exception):
@@ -8,45 +11,210 @@ class ObjectDoesNotExist(Exception):
         super().__init__('Object does not exist')
 
 
+# Inside `with unit_of_work:` every item is fetched at most once and writes are
+# buffered until flush() or until the block exits. Outside of it reads are not cached
+# and writes go straight to DynamoDB.
+class UnitOfWork:
+    def __init__(self, db):
+        self.db = db
+        self.depth = 0
+        self.identity_map = {}
+        self.new = {}
+        self.dirty = {}
+
+    def __enter__(self):
+        if not self.depth:
+            self.clear()
+        self.depth += 1
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.depth -= 1
+        if not self.depth:
+            # a block that failed halfway leaves nothing behind that was never confirmed
+            if exc_type is not None:
+                self.clear()
+                return
+
+            try:
+                self.flush()
+            finally:
+                self.clear()
+
+    @property
+    def active(self):
+        return self.depth > 0
+
+    def clear(self):
+        self.identity_map.clear()
+        self.new.clear()
+        self.dirty.clear()
+
+    def get(self, identity):
+        return self.identity_map.get(identity)
+
+    def remember(self, identity, item):
+        if self.active:
+            self.identity_map.setdefault(identity, item)
+
+    def register_new(self, identity, item):
+        if self.active:
+            self.identity_map[identity] = item
+        self.new[identity] = item
+        self.dirty.pop(identity, None)
+        self._autoflush()
+
+    def register_update(self, identity, changes):
+        item = self.identity_map.get(identity)
+        for path, value in changes.items():
+            if item is not None:
+                _apply_change(item, path, value)
+            if identity in self.new:
+                if item is None:
+                    _apply_change(self.new[identity], path, value)
+                continue
+            self._record_change(self.dirty.setdefault(identity, {}), path, value)
+        self._autoflush()
+
+    def flush(self):
+        operations = [('update', table_name, hash_value, sort_value, _update_expression(changes))
+                      for (table_name, hash_value, sort_value), changes in self.dirty.items()]
+        operations += [('put', table_name, item) for (table_name, _, _), item in self.new.items()]
+
+        self.new.clear()
+        self.dirty.clear()
+
+        if not operations:
+            return
+
+        try:
+            self.db.write_items(operations)
+        except Exception:
+            # cached items already carry the lost changes
+            self.identity_map.clear()
+            raise
+
+    def _autoflush(self):
+        if not self.active:
+            self.flush()
+
+    @staticmethod
+    def _record_change(changes, path, value):
+        for pending in list(changes):
+            if pending[:len(path)] == path:
+                del changes[pending]
+            elif path[:len(pending)] == pending and changes[pending] is not REMOVE:
+                _apply_change(changes[pending], path[len(pending):], value)
+                return
+        changes[path] = value
+
+
+def _apply_change(item, path, value):
+    for name in path[:-1]:
+        item = item.setdefault(name, {})
+    if value is REMOVE:
+        item.pop(path[-1], None)
+    else:
+        item[path[-1]] = value
+
+
+def _update_expression(changes):
+    set_parts = []
+    remove_parts = []
+    names = {}
+    values = {}
+
+    for i, (path, value) in enumerate(changes.items()):
+        placeholders = []
+        for j, name in enumerate(path):
+            names[f'#p{i}_{j}'] = name
+            placeholders.append(f'#p{i}_{j}')
+        path_expr = '.'.join(placeholders)
+
+        if value is REMOVE:
+            remove_parts.append(path_expr)
+        else:
+            values[f':v{i}'] = value
+            set_parts.append(f'{path_expr} = :v{i}')
+
+    clauses = []
+    if set_parts:
+        clauses.append('SET ' + ', '.join(set_parts))
+    if remove_parts:
+        clauses.append('REMOVE ' + ', '.join(remove_parts))
+
+    return {
+        'UpdateExpression': ' '.join(clauses),
+        'ExpressionAttributeNames': names,
+        'ExpressionAttributeValues': values or None
+    }
+
+
 class BaseManager:
     db = DynamoConnector(bot_config.AWS_ACCESS_KEY_ID,
                          bot_config.AWS_SECRET_ACCESS_KEY, bot_config.AWS_DEFAULT_REGION)
+    session = UnitOfWork(db)
 
-    def __init__(self, table_name, fields, cls):
+    def __init__(self, table_name, fields, cls, indexes=None):
         self.table_name = table_name
         self.fields = fields
         self.cls = cls
+        self.indexes = indexes or {}
 
     def filter(self, **kwargs):
         table = self.db.get_table(self.table_name)
 
         return table.scan(**kwargs)['Items']
 
+    def query(self, key_condition, index=None, projection=None, filter_expression=None, limit=None):
+        if index is not None and index not in self.indexes:
+            raise ValueError(f'{self.table_name} has no index {index}')
+
+        items = self.db.query_items(self.table_name, key_condition,
+                                    index_name=index,
+                                    projection=projection,
+                                    filter_expression=filter_expression,
+                                    limit=limit)
+
+        if not projection and (index is None or self.indexes[index].get('projection') is None):
+            for item in items:
+                self.session.remember(self._item_identity(item), item)
+
+        return items
+
     def all(self):
-        return self.db.get_table_items(self.table_name)
+        items = self.db.get_table_items(self.table_name)
+        for item in items:
+            self.session.remember(self._item_identity(item), item)
+
+        return items
 
     def paginate(self, page):
         return self.db.get_table_items(self.table_name, page)
 
     def create(self, item):
-        self.db.add_item(self.table_name, item)
+        self.session.register_new(self._item_identity(item), item)
 
-    def update_item(self, pk, update_expr, attr_values=None, attr_names=None, sort_key=None):
-        self.db.update_item(self.table_name, pk,
-                            UpdateExpression=update_expr,
-                            ExpressionAttributeValues=attr_values,
-                            ExpressionAttributeNames=attr_names,
-                            sort_key=sort_key)
+    def update_item(self, pk, changes, sort_key=None):
+        # changes maps attribute paths (tuples of names) to new values or REMOVE
+        self.session.register_update(self._identity(pk, sort_key), changes)
 
-    def get(self, pk, sort_key=None):
-        item = self.db.check_item(self.table_name, pk, sort_key)
+    def get_item(self, pk, sort_key=None):
+        identity = self._identity(pk, sort_key)
+        item = self.session.get(identity)
 
-        if not item:
-            raise ObjectDoesNotExist()
+        if item is None:
+            item = self.db.check_item(self.table_name, pk, sort_key)
+            if not item:
+                raise ObjectDoesNotExist()
+            self.session.remember(identity, item)
 
-        if sort_key:
-            return eval(self.cls)(pk, sort_key)
-        return eval(self.cls)(pk)
+        return item
+
+    def get(self, pk, sort_key=None):
+        self.get_item(pk, sort_key)
+
+        return self._instance(pk, sort_key)
 
     def get_or_create(self, pk, sort_key=None):
         try:
@@ -54,30 +222,62 @@ class BaseManager:
         except ObjectDoesNotExist:
             item = self.db.get_new_item(self.table_name, pk, sort_key, self.fields)
             self.create(item)
-            return self.get(pk, sort_key)
+            return self._instance(pk, sort_key)
+
+    def _instance(self, pk, sort_key):
+        if sort_key:
+            return self.cls(pk, sort_key)
+        return self.cls(pk)
+
+    def _identity(self, pk, sort_key=None):
+        return self.table_name, pk, sort_key
+
+    def _item_identity(self, item):
+        schema = self.db.KEY_SCHEMAS[self.table_name]
+        sort_key = item[schema[1]['AttributeName']] if len(schema) > 1 else None
+
+        return self._identity(item[schema[0]['AttributeName']], sort_key)
+
+
+unit_of_work = BaseManager.session
 
 
 class Meta(type):
     def __new__(mcs, name, bases, attrs):
-        attrs['objects'] = BaseManager(attrs['table_name'], attrs['fields'], name)
-        return super().__new__(mcs, name, bases, attrs)
+        cls = super().__new__(mcs, name, bases, attrs)
+        indexes = attrs.get('indexes', {})
+        cls.objects = BaseManager(attrs['table_name'], attrs['fields'], cls, indexes)
+        DynamoConnector.register_model(attrs['table_name'], attrs['fields'], indexes)
+        return cls
 
 
 class Model(metaclass=Meta):
     table_name = None
     fields = {}
-    objects = BaseManager(table_name, fields, None)
+    indexes = {}
     pk = None
     sort_key = None
 
     def get_data(self):
-        return self.objects.db.get_item(self.table_name, self.pk, self.sort_key)
+        return copy.deepcopy(self.objects.get_item(self.pk, self.sort_key))
 
 
 class User(Model):
+    DIGEST_SCHEDULES = ['intraday', 'end_of_day', 'weekly', 'threshold']
+
     table_name = 'users'
     fields = {
-        'tickers': dict
+        'tickers': dict,
+        'digest': 'intraday',
+        'digest_threshold': bot_config.DIGEST_DEFAULT_THRESHOLD,
+        'digest_sent_on': '1970-01-01'
+    }
+    indexes = {
+        'digest-index': {
+            'hash_key': ('digest', 'S'),
+            'sort_key': ('digest_sent_on', 'S'),
+            'projection': ['tickers', 'digest_threshold']
+        }
     }
 
     def __init__(self, user_id):
@@ -85,8 +285,7 @@ class User(Model):
         self.pk = user_id
 
     def get_shares(self):
-        return self.objects.filter(FilterExpression=Attr('user_id').eq(self.id),
-                                   ProjectionExpression='tickers')[0]['tickers']
+        return self.get_data()['tickers']
 
     def get_tickers(self):
         return list(self.get_shares().keys())
@@ -95,17 +294,36 @@ class User(Model):
         self.update_ticker(ticker, amount)
 
     def delete_ticker(self, ticker):
-        self.objects.update_item(self.id,
-                                 update_expr='REMOVE tickers.#share',
-                                 attr_names={'#share': f'{ticker.upper()}'})
+        self.objects.update_item(self.id, {('tickers', ticker.upper()): REMOVE})
 
     def update_ticker(self, ticker, amount):
-        self.objects.update_item(self.id,
-                                 update_expr='SET tickers.#share = :share',
-                                 attr_names={'#share': f'{ticker.upper()}'},
-                                 attr_values={
-                                     ':share': {'amount': amount}
-                                 })
+        self.objects.update_item(self.id, {('tickers', ticker.upper()): {'amount': amount}})
+
+    def get_digest(self):
+        data = self.get_data()
+        return data.get('digest', self.fields['digest']), data.get('digest_threshold', self.fields['digest_threshold'])
+
+    def set_digest(self, schedule, threshold=None):
+        changes = {('digest',): schedule}
+        if threshold is not None:
+            changes[('digest_threshold',)] = threshold
+
+        self.objects.update_item(self.id, changes)
+
+    # written straight away rather than with the unit of work: the digest is already out,
+    # and this mark is what keeps the next refresh from sending it again
+    def mark_digest_sent(self, day):
+        self.objects.db.update_item(self.table_name, self.id, **_update_expression({('digest_sent_on',): day}))
+
+    @classmethod
+    def get_digest_recipients(cls, schedule, sent_before=None):
+        from boto3.dynamodb.conditions import Key
+
+        key_condition = Key('digest').eq(schedule)
+        if sent_before:
+            key_condition &= Key('digest_sent_on').lt(sent_before)
+
+        return cls.objects.query(key_condition, index='digest-index')
 
 
 class Exchange(Model):
@@ -127,4 +345,6 @@ class Exchange(Model):
 
     @classmethod
     def update_shares(cls):
-        cls.objects.db.pool_data(cls.table_name)
+        shares = cls.objects.db.pool_data(cls.table_name)
+        return {share['ticker']: share for share in shares}
+
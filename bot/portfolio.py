@@ -0,0 +1,34 @@
+from models import User, Exchange
+
+
+def get_user_shares(user_id, change=False):
+    from boto3.dynamodb.conditions import Attr
+
+    user = User.objects.get(user_id)
+
+    user_shares = user.get_shares()
+    user_tickers = user.get_tickers()
+
+    if not user_tickers:
+        return []
+
+    exchange_shares = Exchange.objects.filter(FilterExpression=Attr('ticker').is_in(user_tickers),
+                                              ProjectionExpression='ticker,lot_price,lot_price_change')
+
+    return value_shares(user_shares, {share['ticker']: share for share in exchange_shares}, change)
+
+
+def value_shares(user_shares, exchange_shares, change=False):
+    shares = []
+    for ticker, user_share in user_shares.items():
+        if ticker not in exchange_shares:
+            continue
+
+        share = {key: exchange_shares[ticker][key] for key in ('ticker', 'lot_price', 'lot_price_change')}
+        share['users_capitalization'] = share['lot_price'] * user_share['amount']
+        share['amount'] = user_share['amount']
+        if change:
+            share['change'] = round(share['amount'] * share['lot_price_change'])
+        shares.append(share)
+
+    return shares
@@ -0,0 +1,7 @@
+from models import Exchange
+import digest
+
+
+def refresh_shares():
+    snapshot = Exchange.update_shares()
+    digest.send_digests(snapshot)
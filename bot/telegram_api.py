@@ -0,0 +1,18 @@
+import bot_config
+import clients
+
+
+# Plain Bot API calls for paths that should not pay for importing telebot
+API_URL = 'https://api.telegram.org/bot{token}/{method}'
+
+
+def call(method, **params):
+    url = API_URL.format(token=bot_config.TELEGRAM_TOKEN, method=method)
+    response = clients.get_http_session().post(url, data=params, timeout=clients.get_http_timeout())
+    response.raise_for_status()
+
+    return response.json()['result']
+
+
+def send_message(chat_id, text):
+    return call('sendMessage', chat_id=chat_id, text=text)
@@ -4,8 +4,24 @@ while read file; do
    export "$file"
    done < .env
 
-cd bot
-zip -g ../bot.zip . -r
+# dependencies and sources are assembled in a fresh build directory; boto3 is installed only for
+# the migration below, the Lambda runtime already provides it
+rm -rf build bot.zip
+python3 -m pip install -q -r requirements.txt boto3 -t build
+cp -r bot/. build/
+
+# tables and indexes the new code relies on have to exist before it goes live
+PYTHONPATH=build python3 tools/migrate.py
+
+# leave out bytecode caches, package metadata, tests and the runtime-provided AWS SDK
+cd build
+zip -9 -q -r ../bot.zip . \
+    -x '*__pycache__*' '*.pyc' '*.pyi' \
+    -x '*.dist-info/*' '*.egg-info/*' \
+    -x '*/tests/*' '*/test/*' \
+    -x 'boto3/*' 'botocore/*' 's3transfer/*' 'jmespath/*' 'dateutil/*' 'six.py' \
+    -x 'bin/*'
 cd ../
+du -h bot.zip
 
 aws lambda update-function-code --function-name processBot --zip-file fileb://bot.zip --publish
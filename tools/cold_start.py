@@ -0,0 +1,77 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+
+BOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bot')
+
+ENTRY_PATHS = {
+    'handler': ['lambda_function'],
+    'webhook': ['lambda_function', 'handlers'],
+    'refresh': ['lambda_function', 'refresh'],
+}
+
+
+def measure(modules):
+    code = ';'.join(f'import {module}' for module in modules)
+    # bot_config reads these at import time and telebot refuses to start without a token
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+    env.setdefault('TELEGRAM_TOKEN', '123456:COLDSTART')
+    env.setdefault('MY_AWS_ACCESS_KEY_ID', 'testing')
+    env.setdefault('MY_AWS_SECRET_ACCESS_KEY', 'testing')
+    env.setdefault('MY_AWS_DEFAULT_REGION', 'us-east-1')
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                            cwd=BOT_DIR, env=env, capture_output=True, text=True)
+    if result.returncode:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+    # lines look like "import time:   self [us] | cumulative | imported package"
+    timings = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        timings[name.strip()] = (int(self_us), int(cumulative_us))
+
+    return timings
+
+
+def report(path, runs, top):
+    samples = [measure(ENTRY_PATHS[path]) for _ in range(runs)]
+
+    modules = set().union(*samples)
+    rows = []
+    for module in modules:
+        rows.append((module,
+                     statistics.median(sample.get(module, (0, 0))[0] for sample in samples),
+                     statistics.median(sample.get(module, (0, 0))[1] for sample in samples)))
+
+    total = statistics.median(sum(self_us for self_us, _ in sample.values()) for sample in samples)
+
+    print(f'{path}: {len(modules)} modules, {total / 1000:.1f} ms total import time (median of {runs})')
+    print(f'{"self ms":>10} {"cumul ms":>10}  module')
+    for module, self_us, cumulative_us in sorted(rows, key=lambda row: row[1], reverse=True)[:top]:
+        print(f'{self_us / 1000:>10.2f} {cumulative_us / 1000:>10.2f}  {module}')
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Report import time per module for each Lambda entry path')
+    # no choices= here: with nargs='*' argparse validates the empty default against them and fails
+    parser.add_argument('paths', nargs='*', help=f'entry paths to measure, any of {", ".join(ENTRY_PATHS)}')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=25)
+    args = parser.parse_args()
+
+    unknown = set(args.paths) - set(ENTRY_PATHS)
+    if unknown:
+        parser.error(f'unknown entry paths: {", ".join(sorted(unknown))}')
+
+    for path in args.paths or ENTRY_PATHS:
+        report(path, args.runs, args.top)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+import itertools
+import json
+import random
+import threading
+import time
+from urllib.parse import urlparse, parse_qsl
+
+from requests import Response
+from requests.adapters import BaseAdapter
+
+
+# In-process stand-ins for the HTTP services the bot talks to. They are mounted on the shared
+# requests.Session from clients.py, so every ISS and Telegram call made by the bot goes through them.
+class FakeAdapter(BaseAdapter):
+    def __init__(self, latency=0.0):
+        super().__init__()
+        self.latency = latency
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def send(self, request, **kwargs):
+        with self.lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+        status, payload = self.handle(request)
+
+        response = Response()
+        response.status_code = status
+        response._content = json.dumps(payload).encode()
+        response.headers['Content-Type'] = 'application/json'
+        response.url = request.url
+        response.request = request
+        return response
+
+    def handle(self, request):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class FakeTelegram(FakeAdapter):
+    def __init__(self, latency=0.0):
+        super().__init__(latency)
+        self.message_ids = itertools.count(1)
+        self.methods = {}
+
+    def handle(self, request):
+        method = urlparse(request.url).path.rsplit('/', 1)[-1]
+        params = dict(parse_qsl(urlparse(request.url).query))
+        content_type = request.headers.get('Content-Type', '')
+        if request.body and content_type.startswith('application/json'):
+            params.update(json.loads(request.body))
+        elif request.body and content_type.startswith('application/x-www-form-urlencoded'):
+            params.update(parse_qsl(request.body))
+
+        with self.lock:
+            self.methods[method] = self.methods.get(method, 0) + 1
+
+        if method == 'sendMessage':
+            return 200, {'ok': True, 'result': {
+                'message_id': next(self.message_ids),
+                'date': int(time.time()),
+                'chat': {'id': int(params['chat_id']), 'type': 'private'},
+                'text': params.get('text', '')
+            }}
+        return 200, {'ok': True, 'result': True}
+
+
+class FakeExchange(FakeAdapter):
+    def __init__(self, tickers, latency=0.0):
+        super().__init__(latency)
+        self.tickers = tickers
+
+    def handle(self, request):
+        securities = []
+        marketdata = []
+        for ticker in self.tickers:
+            rnd = random.Random(ticker)
+            securities.append([ticker, rnd.choice([1, 10, 100]), f'{ticker} company'])
+            marketdata.append([ticker, round(rnd.uniform(1, 5000), 2), round(random.uniform(-50, 50), 2)])
+
+        return 200, {'securities': {'data': securities}, 'marketdata': {'data': marketdata}}
+
+
+def make_tickers(count):
+    letters = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+    return [''.join(chars) for chars in itertools.islice(itertools.product(letters, repeat=4), count)]
+
+
+def install(session, tickers, telegram_latency=0.0, exchange_latency=0.0):
+    telegram = FakeTelegram(telegram_latency)
+    exchange = FakeExchange(tickers, exchange_latency)
+    session.mount('https://api.telegram.org', telegram)
+    session.mount('https://iss.moex.com', exchange)
+
+    return telegram, exchange
+
+
+DIGEST_MIX = {'intraday': 4, 'end_of_day': 3, 'weekly': 2, 'threshold': 1}
+
+
+def make_user(user_id, tickers, holdings_per_user):
+    held = random.sample(tickers, min(holdings_per_user, len(tickers)))
+
+    return {
+        'user_id': user_id,
+        'tickers': {ticker: {'amount': random.randint(1, 100)} for ticker in held},
+        'digest': random.choices(list(DIGEST_MIX), list(DIGEST_MIX.values()))[0],
+        'digest_threshold': random.choice([100, 1000, 10000]),
+        'digest_sent_on': '1970-01-01'
+    }
+
+
+def make_update(update_id, user_id, text=None, callback_data=None):
+    sender = {'id': user_id, 'is_bot': False, 'first_name': f'user{user_id}'}
+    chat = {'id': user_id, 'type': 'private'}
+    message = {'message_id': update_id, 'date': int(time.time()), 'chat': chat, 'from': sender}
+
+    if callback_data is not None:
+        return {'update_id': update_id, 'callback_query': {
+            'id': str(update_id), 'from': sender, 'chat_instance': str(user_id),
+            'message': dict(message, text='Список тикеров'), 'data': callback_data
+        }}
+
+    message['text'] = text
+    if text.startswith('/'):
+        command = text.split()[0]
+        message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(command)}]
+
+    return {'update_id': update_id, 'message': message}
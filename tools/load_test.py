@@ -0,0 +1,283 @@
+import argparse
+import concurrent.futures
+import contextlib
+import io
+import json
+import logging
+import multiprocessing
+import os
+import random
+import socket
+import statistics
+import sys
+import time
+
+BOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bot')
+sys.path.insert(0, BOT_DIR)
+
+import fakes  # noqa: E402
+
+
+# Replays Telegram updates into lambda_handler against local stand-ins of the Telegram Bot API, MOEX ISS
+# and DynamoDB (a moto server, so moto[server] must be installed, or any endpoint such as DynamoDB Local).
+# Every worker process plays the part of one warm Lambda container.
+COMMAND_MIX = {
+    '/start': 2,
+    '/help': 5,
+    '/my_tickers': 25,
+    '/my_investment_portfolio': 30,
+    '/ticker_list': 15,
+    'ticker_list_next_page': 10,
+    '/detail': 8,
+    '/cancel': 5,
+    '/digest': 3,
+    '/digest end_of_day': 2,
+}
+
+
+def configure_environment(endpoint_url):
+    os.environ.update({
+        'TELEGRAM_TOKEN': '123456:LOADTEST',
+        'MY_AWS_ACCESS_KEY_ID': 'testing',
+        'MY_AWS_SECRET_ACCESS_KEY': 'testing',
+        'MY_AWS_DEFAULT_REGION': 'us-east-1',
+        'MY_AWS_ENDPOINT_URL': endpoint_url,
+    })
+
+
+def start_dynamodb():
+    from moto.server import ThreadedMotoServer
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+
+    server = ThreadedMotoServer(ip_address='127.0.0.1', port=port)
+    server.start()
+
+    return server, f'http://127.0.0.1:{port}'
+
+
+class Counters:
+    def __init__(self):
+        self.dynamodb = 0
+        self.telegram = None
+        self.exchange = None
+
+    def snapshot(self):
+        return self.dynamodb, self.telegram.calls, self.exchange.calls
+
+
+_counters = Counters()
+
+
+def setup_process(endpoint_url, tickers, telegram_latency, exchange_latency):
+    configure_environment(endpoint_url)
+
+    import bot_config
+    import clients
+
+    _counters.telegram, _counters.exchange = fakes.install(clients.get_http_session(), tickers,
+                                                           telegram_latency, exchange_latency)
+
+    resource = clients.get_dynamodb(bot_config.AWS_ACCESS_KEY_ID, bot_config.AWS_SECRET_ACCESS_KEY,
+                                    bot_config.AWS_DEFAULT_REGION)
+    resource.meta.client.meta.events.register('before-call.dynamodb', _count_dynamodb_call)
+
+
+def _count_dynamodb_call(**kwargs):
+    _counters.dynamodb += 1
+
+
+def invoke(label, event):
+    import lambda_function
+
+    before = _counters.snapshot()
+    output = io.StringIO()
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(output):
+        lambda_function.lambda_handler(event, None)
+    elapsed = time.perf_counter() - started
+    after = _counters.snapshot()
+
+    # lambda_handler swallows exceptions and prints them
+    return {
+        'label': label,
+        'latency': elapsed,
+        'finished': time.time(),
+        'dynamodb': after[0] - before[0],
+        'telegram': after[1] - before[1],
+        'exchange': after[2] - before[2],
+        'error': output.getvalue().strip() or None,
+    }
+
+
+def seed(users, tickers, holdings_per_user):
+    from models import BaseManager
+
+    db = BaseManager.db
+    db.check_tables()
+
+    with db.get_table('users').batch_writer() as batch:
+        for user_id in range(1, users + 1):
+            batch.put_item(Item=fakes.make_user(user_id, tickers, holdings_per_user))
+
+
+def label_update(update):
+    if 'callback_query' in update:
+        return update['callback_query']['data'].split()[0]
+
+    text = update.get('message', {}).get('text') or ''
+    if text.startswith('/'):
+        return text.split()[0].split('@')[0]
+    return 'text'
+
+
+def load_events(path):
+    events = []
+    with open(path) as file:
+        for line in file:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if 'body' not in record:
+                record = {'body': json.dumps(record)}
+            events.append((label_update(json.loads(record['body'])), record))
+
+    return events
+
+
+def synthetic_events(count, users, duplicates):
+    commands = list(COMMAND_MIX)
+    weights = list(COMMAND_MIX.values())
+
+    events = []
+    for update_id in range(1, count + 1):
+        if events and random.random() < duplicates:
+            events.append(random.choice(events))
+            continue
+
+        user_id = random.randint(1, users)
+        command = random.choices(commands, weights)[0]
+        if command.startswith('/'):
+            update = fakes.make_update(update_id, user_id, text=command)
+        else:
+            update = fakes.make_update(update_id, user_id, callback_data=f'{command} 2')
+        events.append((command, {'body': json.dumps(update)}))
+
+    return events
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+def print_report(title, results, wall_time=None):
+    print(title)
+    print(f'{"command":<26} {"count":>6} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} '
+          f'{"ddb/upd":>8} {"tg/upd":>7} {"iss/upd":>8} {"errors":>6}')
+
+    groups = {}
+    for result in results:
+        groups.setdefault(result['label'], []).append(result)
+    if len(groups) > 1:
+        groups['all'] = results
+
+    for label, group in groups.items():
+        latencies = [result['latency'] * 1000 for result in group]
+        print(f'{label:<26} {len(group):>6} {percentile(latencies, 0.5):>8.1f} {percentile(latencies, 0.95):>8.1f} '
+              f'{percentile(latencies, 0.99):>8.1f} '
+              f'{statistics.mean(result["dynamodb"] for result in group):>8.2f} '
+              f'{statistics.mean(result["telegram"] for result in group):>7.2f} '
+              f'{statistics.mean(result["exchange"] for result in group):>8.2f} '
+              f'{sum(1 for result in group if result["error"]):>6}')
+
+    if wall_time:
+        print(f'throughput: {len(results) / wall_time:.1f} updates/s over {wall_time:.1f}s')
+
+    errors = {result['error'] for result in results if result['error']}
+    for error in list(errors)[:5]:
+        print(f'error: {error}')
+    print()
+
+
+def run_updates(executor, events, rate):
+    futures = []
+    scheduled = []
+    started = time.time()
+    for i, (label, event) in enumerate(events):
+        if rate:
+            delay = started + i / rate - time.time()
+            if delay > 0:
+                time.sleep(delay)
+        scheduled.append(time.time())
+        futures.append(executor.submit(invoke, label, event))
+
+    results = [future.result() for future in futures]
+    wall_time = max(result['finished'] for result in results) - started
+    queueing = [result['finished'] - result['latency'] - submitted for result, submitted in zip(results, scheduled)]
+
+    print_report(f'webhook updates (rate={rate or "unbounded"}/s)', results, wall_time)
+    print(f'queueing delay p50/p95/p99: {percentile(queueing, 0.5) * 1000:.1f}/'
+          f'{percentile(queueing, 0.95) * 1000:.1f}/{percentile(queueing, 0.99) * 1000:.1f} ms')
+    print()
+
+
+def run_refresh(executor, runs):
+    results = [executor.submit(invoke, 'refresh', {'source': 'aws.events'}).result() for _ in range(runs)]
+    print_report('scheduled refresh', results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay Telegram updates into lambda_handler against local fakes')
+    parser.add_argument('--updates', help='JSON lines file of recorded Telegram updates or Lambda events')
+    parser.add_argument('--count', type=int, default=500, help='number of synthetic updates')
+    parser.add_argument('--rate', type=float, default=0, help='updates per second, 0 for as fast as possible')
+    parser.add_argument('--concurrency', type=int, default=4, help='number of simulated warm containers')
+    parser.add_argument('--duplicates', type=float, default=0.0, help='share of redelivered updates')
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--tickers', type=int, default=250)
+    parser.add_argument('--holdings', type=int, default=8, help='tickers per user')
+    parser.add_argument('--refresh-runs', type=int, default=3, help='scheduled refresh invocations to measure')
+    parser.add_argument('--telegram-latency-ms', type=float, default=0)
+    parser.add_argument('--iss-latency-ms', type=float, default=0)
+    parser.add_argument('--dynamodb-endpoint', help='use e.g. DynamoDB Local instead of an in-process moto server')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+
+    server = None
+    endpoint_url = args.dynamodb_endpoint
+    if not endpoint_url:
+        server, endpoint_url = start_dynamodb()
+
+    tickers = fakes.make_tickers(args.tickers)
+    latencies = (args.telegram_latency_ms / 1000, args.iss_latency_ms / 1000)
+
+    try:
+        setup_process(endpoint_url, tickers, *latencies)
+        seed(args.users, tickers, args.holdings)
+
+        if args.updates:
+            events = load_events(args.updates)
+        else:
+            events = synthetic_events(args.count, args.users, args.duplicates)
+
+        context = multiprocessing.get_context('spawn')
+        with concurrent.futures.ProcessPoolExecutor(args.concurrency, mp_context=context,
+                                                    initializer=setup_process,
+                                                    initargs=(endpoint_url, tickers, *latencies)) as executor:
+            run_updates(executor, events, args.rate)
+            if args.refresh_runs:
+                run_refresh(executor, args.refresh_runs)
+    finally:
+        if server:
+            server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,19 @@
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bot'))
+
+# models registers the indexes and fields that provisioning needs
+from models import BaseManager  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Create missing DynamoDB tables and indexes and fill in new fields')
+    parser.parse_args()
+
+    BaseManager.db.migrate()
+
+
+if __name__ == '__main__':
+    main()